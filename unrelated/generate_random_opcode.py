@@ -57,32 +57,39 @@ def generate_random_opcode(num_opcodes, file_path):
     # Define possible opcodes
     opcodes = ['mul', 'add', 'addi']  # Only include 'mul' and 'addi' for subsequent lines
     
+    registers = [name for name, _ in register_mapping]
+    count = max(num_opcodes - 1, 0)
+
+    # Draw all the randomness up front
+    ops = random.choices(opcodes, k=count)
+    reg_des = random.choices(registers, k=count)
+    reg_lhs = random.choices(registers, k=count)
+    reg_rhs = random.choices(registers, k=count)
+
+    # 'add' needs distinct source registers, resample only the collisions
+    for i, opcode in enumerate(ops):
+        if opcode == 'add':
+            while reg_rhs[i] == reg_lhs[i]:
+                reg_rhs[i] = random.choice(registers)
+
+    # 'addi' takes an immediate instead of a source register
+    # Drawn from the same RNG so random.seed() reproduces the whole program
+    addi_rows = [i for i, opcode in enumerate(ops) if opcode == 'addi']
+    for i in addi_rows:
+        reg_rhs[i] = str(random.randint(range_num[0], range_num[1]))
+
+    lines = [
+        f"{opcode:<8}{des}, {lhs}, {rhs}\n"
+        for opcode, des, lhs, rhs in zip(ops, reg_des, reg_lhs, reg_rhs)
+    ]
+
+    # Write the whole program at once
     with open(file_path, 'w') as file:
-        # Generate the remaining random opcodes
-        for _ in range(1, num_opcodes):
-            opcode = random.choice(opcodes)
-            reg_des = ""
-            reg_lhs = ""
-            reg_rhs = ""
-            
-            if opcode == 'add':
-                reg_des = random.choice(register_mapping)[0]
-                reg_lhs = random.choice(register_mapping)[0]
-                reg_rhs = random.choice(register_mapping)[0]
-                while reg_rhs == reg_lhs:
-                    reg_rhs = random.choice(register_mapping)[0]
-
-            if opcode == 'addi':
-                reg_des = random.choice(register_mapping)[0]
-                reg_lhs = random.choice(register_mapping)[0]
-                reg_rhs = str(random.randint(range_num[0], range_num[1]))
-                
-            if opcode == 'mul':
-                reg_des = random.choice(register_mapping)[0]
-                reg_lhs = random.choice(register_mapping)[0]
-                reg_rhs = random.choice(register_mapping)[0]
-                
-            file.write(f"{opcode:<8}{reg_des}, {reg_lhs}, {reg_rhs}\n")
+        file.write("".join(lines))
+
+    # Return (n_i, n_g) so callers don't have to re-read the file, no 'ld'
+    # instructions are generated so every line is a gate
+    return 0, len(lines)
 
 
 def write_numbers_to_file(count, filename):
@@ -91,9 +98,10 @@ def write_numbers_to_file(count, filename):
             file.write(f"{number}\n")
 
 
-# Specify the number of opcodes to generate and the output file path
-num_opcodes = int(sys.argv[1])  # You can change this to generate more or fewer opcodes
-file_path = 'program.s' 
-generate_random_opcode(num_opcodes + 1, file_path)
+if __name__ == "__main__":
+    # Specify the number of opcodes to generate and the output file path
+    num_opcodes = int(sys.argv[1])  # You can change this to generate more or fewer opcodes
+    file_path = 'program.s' 
+    generate_random_opcode(num_opcodes + 1, file_path)
 
-print(f"Generated {num_opcodes} opcodes and saved to '{file_path}'.")
+    print(f"Generated {num_opcodes} opcodes and saved to '{file_path}'.")
@@ -14,38 +14,99 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from sympy import is_primitive_root
+from functools import lru_cache
+from math import isqrt, lcm
+from sympy import factorint
 import json
-
-def is_prime(n):
-    if n <= 1:
+import os
+
+# First 50 primes, used by prime_factors to strip small factors of p - 1
+SMALL_PRIMES = [
+    2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71,
+    73, 79, 83, 89, 97, 101, 103, 107, 109, 113, 127, 131, 137, 139, 149, 151,
+    157, 163, 167, 173, 179, 181, 191, 193, 197, 199, 211, 223, 227, 229,
+]
+
+def _miller_rabin(n, witnesses=(2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)):
+    # Deterministic for n < 3.3 * 10**24 with the default witness set
+    if n < 2:
         return False
-    if n == 2:
-        return True  # 2 is prime
     if n % 2 == 0:
-        return False  # eliminate even numbers
-
-    # Check only odd divisors from 3 to sqrt(n)
-    for i in range(3, int(n**0.5) + 1, 2):
-        if n % i == 0:
+        return n == 2
+
+    # Write n - 1 as d * 2^s with d odd
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    for a in witnesses:
+        if a % n == 0:
+            continue
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
             return False
     return True
 
-def find_large_prime(n, m):
+@lru_cache(maxsize=None)
+def base_primes(limit=100000):
+    # Sieve of Eratosthenes over [0, limit)
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b"\x00\x00"
+    for i in range(2, isqrt(limit) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i in range(limit) if sieve[i]]
+
+def sieve_candidates(start, step, count):
+    # Mark which of start, start + step, ..., start + (count - 1) * step
+    # have no factor among the base primes
+    alive = bytearray([1]) * count
+    for q in base_primes():
+        if step % q == 0:
+            continue  # every candidate is congruent to start (mod q)
+        # First k with start + k * step == 0 (mod q)
+        k = -start * pow(step, -1, q) % q
+        alive[k::q] = bytes(len(range(k, count, q)))
+        # q itself is prime, wherever it falls in the progression
+        if (q - start) % step == 0 and 0 <= (q - start) // step < count:
+            alive[(q - start) // step] = 1
+    return alive
+
+def find_large_prime(n, m, window=1000):
     # max_32_bit = 2**31 - 1
     max_64_bit = 2**63 - 1
-    m = int(m)
-    for num in range(max_64_bit - (max_64_bit - 1) % (n * m), 1, -(n * m)):
-        if is_prime(num):
-            return num
+    step = lcm(int(n), int(m))
+    # Largest candidate below max_64_bit with (num - 1) divisible by n and m
+    start = 1 + step * ((max_64_bit - 1) // step)
+
+    # Sieve the candidates one window at a time, then run Miller-Rabin only
+    # on the survivors
+    for top in range(start, 1, -step * window):
+        count = min(window, len(range(top, 1, -step)))
+        alive = sieve_candidates(top, -step, count)
+        for k in range(count):
+            if alive[k] and _miller_rabin(top - k * step):
+                return top - k * step
     return None
 
-def find_small_prime(n, m):
+def find_small_prime(n, m, window=4096):
     max_32_bit = 2**31 - 1
-    m = int(m)
-    for num in range(1, max_32_bit, 1):
-        if is_prime(num) and (num - 1)% m == 0 and (num - 1) % n == 0:
-            return num
+    step = lcm(int(n), int(m))
+    # Every candidate satisfies (num - 1) % m == 0 and (num - 1) % n == 0
+    for start in range(1 + step, max_32_bit, step * window):
+        count = min(window, len(range(start, max_32_bit, step)))
+        alive = sieve_candidates(start, step, count)
+        for k in range(count):
+            if alive[k] and _miller_rabin(start + k * step):
+                return start + k * step
     return None
 
 
@@ -96,23 +157,80 @@ def count_instructions(file_path):
 
 #     print("Updated 'test' values in class_table.json")
 
+def prime_factors(n):
+    factors = []
+    for p in SMALL_PRIMES:
+        if p * p > n:
+            break
+        if n % p == 0:
+            factors.append(p)
+            while n % p == 0:
+                n //= p
+
+    # Leave the remaining cofactor to sympy, which switches to Pollard rho
+    # and friends instead of trial division up to sqrt(n)
+    if n > 1:
+        factors.extend(factorint(n))
+    return tuple(factors)
+
+def primitive_root(p):
+    # g is a primitive root iff g^((p - 1) / q) != 1 for every prime q | p - 1
+    exps = [(p - 1) // q for q in prime_factors(p - 1)]
+    for g in range(2, p):
+        if all(pow(g, e, p) != 1 for e in exps):
+            return g
+    return None
+
 def find_largest_prime_and_generator(largest_prime):
     if largest_prime:
         print(f"Prime number: {largest_prime}")
 
         # Set p to the largest prime found
         p = largest_prime
-        g = 2
-
-        # Loop to find the smallest primitive root
-        while g < p:
-            if is_primitive_root(g, p):
-                print(f"Generator: {g}")
-                return (p, g)  # Return the tuple (p, g)
-            g += 1
+
+        # Find the smallest primitive root
+        g = primitive_root(p)
+        if g is not None:
+            print(f"Generator: {g}")
+            return (p, g)  # Return the tuple (p, g)
     else:
         print("No such prime number found.")
         return None  # Return None if no prime is found
+
+# Bump whenever find_large_prime or primitive_root can return a different
+# result for the same (n, m), so stale cache entries are not reused
+PRIME_CACHE_VERSION = 1
+
+def find_prime_and_generator_cached(n, m, cache_path='.zkp_prime_cache.json'):
+    # (p, g) only depends on (n, m) and the search itself, so reuse the
+    # result of earlier runs
+    key = f"v{PRIME_CACHE_VERSION}:{int(n)},{int(m)}"
+    try:
+        with open(cache_path, 'r') as file:
+            cache = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cache = {}  # a missing or unreadable cache is rebuilt
+    if not isinstance(cache, dict):
+        cache = {}
+
+    # Malformed entries count as a miss and are overwritten below
+    entry = cache.get(key)
+    if isinstance(entry, dict) and type(entry.get("p")) is int and type(entry.get("g")) is int:
+        p, g = entry["p"], entry["g"]
+        print(f"Prime number: {p}\nGenerator: {g} (cached)")
+        return (p, g)
+
+    result = find_largest_prime_and_generator(find_large_prime(n, m))
+    if result:
+        p, g = result
+        cache[key] = {"p": p, "g": g}
+        # Write to a temp file and swap it in so an interrupted run can't
+        # leave a truncated cache behind
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(cache, file, indent=4)
+        os.replace(tmp_path, cache_path)
+    return result
     
 def update_rust_constants(p, g, file_path='src/math.rs'):
     # Read the existing content of the Rust file
@@ -138,6 +256,11 @@ def update_rust_constants(p, g, file_path='src/math.rs'):
 
 # Count the instructions
 # n_i, n_g = count_instructions(file_path)
+
+# Or take the counts straight from the generator and skip re-reading the file
+# from generate_random_opcode import generate_random_opcode
+# num_opcodes = 64  # Number of opcodes to generate
+# n_i, n_g = generate_random_opcode(num_opcodes + 1, file_path)
 # n = n_i + n_g + 1
 # m = ((n**2 - n ) / 2) - ((t**2 - t ) / 2)
 # m = 2 * n_g
@@ -163,6 +286,8 @@ print(f"n: {n}\nm: {int(m)}")
 prime = 6227521
 
 (p, g) = find_largest_prime_and_generator(prime)
+# Opt-in: search from (n, m) and reuse the result across runs
+# (p, g) = find_prime_and_generator_cached(n, m)
 
 # update_test_values(n_g, n_i, int(m), n)
 # update_rust_constants(p, g)
@@ -12,34 +12,144 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
-use std::collections::HashMap;
-use std::iter::FromIterator;
 use std::fs::File;
-use std::io::{self, BufRead, Write};
+use std::io::{self, BufRead, BufWriter, Write};
+use std::sync::OnceLock;
+
+const REGISTER_NAMES: [&str; 32] = [
+    "zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2",
+    "s0", "s1", "a0", "a1", "a2", "a3", "a4", "a5",
+    "a6", "a7", "s2", "s3", "s4", "s5", "s6", "s7",
+    "s8", "s9", "s10", "s11", "t3", "t4", "t5", "t6",
+];
+
+/// Maps an ABI register name to its index in the register file. The
+/// lookup table is built from `REGISTER_NAMES` once, sorted by name, and
+/// binary searched on every call.
+fn register_index(name: &str) -> Option<usize> {
+    static SORTED_REGISTERS: OnceLock<[(&str, usize); 32]> = OnceLock::new();
+    let sorted = SORTED_REGISTERS.get_or_init(|| {
+        let mut table: [(&str, usize); 32] = std::array::from_fn(|i| (REGISTER_NAMES[i], i));
+        table.sort_unstable();
+        table
+    });
+    sorted
+        .binary_search_by(|&(r, _)| r.cmp(name))
+        .ok()
+        .map(|i| sorted[i].1)
+}
+
+#[derive(Clone, Copy)]
+enum Opcode {
+    Addi,
+    Add,
+    Mul,
+    Nop,
+}
 
-fn write_vector_to_file(vector: &[u128], filename: &str) -> io::Result<()> {
-    let mut file = File::create(filename)?;
-    let content = vector.iter().map(|v| v.to_string()).collect::<Vec<_>>().join(", ");
-    file.write_all(content.as_bytes())
+/// A decoded instruction with its registers resolved to indices.
+/// `rhs` holds the immediate for `addi` and a register index otherwise.
+#[derive(Clone, Copy)]
+struct Instruction {
+    opcode: Opcode,
+    dst: usize,
+    lhs: usize,
+    rhs: u64,
+}
+
+fn write_vector_to_file(vector: &[u64], filename: &str) -> io::Result<()> {
+    let mut file = BufWriter::new(File::create(filename)?);
+    for (i, v) in vector.iter().enumerate() {
+        if i > 0 {
+            file.write_all(b", ")?;
+        }
+        write!(file, "{}", v)?;
+    }
+    file.flush()
 }
 
-fn parse_file(path: &str) -> io::Result<Vec<(String, Vec<String>)>> {
-    let mut parsed_lines = Vec::new();
-    let file = File::open(path)?;
-    for line in io::BufReader::new(file).lines() {
-        let line = line?.trim().to_string();
+/// Reads `path` and decodes each instruction as it is read. Commas and
+/// whitespace are both treated as separators, so the operands come out
+/// of a single split without any per-operand allocation.
+fn parse_file(path: &str) -> io::Result<Vec<Instruction>> {
+    let mut program = Vec::new();
+    let mut reader = io::BufReader::new(File::open(path)?);
+    let mut line = String::new();
+    loop {
+        line.clear();
+        if reader.read_line(&mut line)? == 0 {
+            break;
+        }
+        let line = line.trim();
         if line.is_empty() || line.starts_with('#') {
             continue;
         }
-        let parts: Vec<&str> = line.split_whitespace().collect();
-        let instruction = parts[0].to_string();
-        let operands = parts[1..]
-            .iter()
-            .map(|&op| op.trim_end_matches(',').to_string())
-            .collect();
-        parsed_lines.push((instruction, operands));
+        let mut parts = line
+            .split(|c: char| c == ',' || c.is_whitespace())
+            .filter(|part| !part.is_empty());
+        let Some(inst) = parts.next() else {
+            continue;
+        };
+        let reg = [parts.next(), parts.next(), parts.next()];
+        if let Some(instruction) = decode_instruction(inst, &reg) {
+            program.push(instruction);
+        }
     }
-    Ok(parsed_lines)
+    Ok(program)
+}
+
+fn decode_instruction(inst: &str, reg: &[Option<&str>; 3]) -> Option<Instruction> {
+    // Lines whose destination is not a register do not contribute to w
+    let dst = register_index(reg[0]?)?;
+    let lhs = reg[1].and_then(register_index);
+    let rhs = match inst {
+        "addi" => reg[2].and_then(|imm| imm.parse::<u64>().ok()),
+        _ => reg[2].and_then(register_index).map(|i| i as u64),
+    };
+    let opcode = match (inst, lhs, rhs) {
+        ("addi", Some(_), Some(_)) => Opcode::Addi,
+        ("add", Some(_), Some(_)) => Opcode::Add,
+        ("mul", Some(_), Some(_)) => Opcode::Mul,
+        _ => Opcode::Nop,
+    };
+    Some(Instruction {
+        opcode,
+        dst,
+        lhs: lhs.unwrap_or(0),
+        rhs: rhs.unwrap_or(0),
+    })
+}
+
+/// Adds two values already reduced modulo `p` without a division.
+#[inline(always)]
+fn add_mod(a: u64, b: u64, p: u64) -> u64 {
+    let (sum, overflow) = a.overflowing_add(b);
+    if overflow || sum >= p {
+        sum.wrapping_sub(p)
+    } else {
+        sum
+    }
+}
+
+/// Evaluates the decoded program and returns the final register file
+/// together with the value written by each instruction.
+fn run(program: &[Instruction], p: u64) -> ([u64; 32], Vec<u64>) {
+    // Register file, each register initially holds its own index
+    let mut regs: [u64; 32] = std::array::from_fn(|i| i as u64 % p);
+    let mut w = Vec::with_capacity(program.len());
+    for inst in program {
+        let lhs = regs[inst.lhs];
+        match inst.opcode {
+            Opcode::Addi => regs[inst.dst] = add_mod(lhs, inst.rhs % p, p),
+            Opcode::Add => regs[inst.dst] = add_mod(lhs, regs[inst.rhs as usize], p),
+            Opcode::Mul => {
+                regs[inst.dst] = (lhs as u128 * regs[inst.rhs as usize] as u128 % p as u128) as u64
+            }
+            Opcode::Nop => {}
+        }
+        w.push(regs[inst.dst]);
+    }
+    (regs, w)
 }
 
 fn main() -> io::Result<()> {
@@ -50,84 +160,21 @@ fn main() -> io::Result<()> {
     let class_json_path = "class.json";
     let class_json = std::fs::read_to_string(class_json_path).unwrap();
     let class_json: serde_json::Value = serde_json::from_str(&class_json).unwrap();
-    let p = class_json[class_number]["p"].as_u64().unwrap() as u128;
-
-    let mut register_map: HashMap<String, u128> = HashMap::from_iter(vec![
-        ("zero".to_owned(), 0), 
-        ("ra".to_owned(), 1), 
-        ("sp".to_owned(), 2), 
-        ("gp".to_owned(), 3), 
-        ("tp".to_owned(), 4),
-        ("t0".to_owned(), 5), 
-        ("t1".to_owned(), 6), 
-        ("t2".to_owned(), 7), 
-        ("s0".to_owned(), 8), 
-        ("s1".to_owned(), 9),
-        ("a0".to_owned(), 10), 
-        ("a1".to_owned(), 11), 
-        ("a2".to_owned(), 12), 
-        ("a3".to_owned(), 13), 
-        ("a4".to_owned(), 14),
-        ("a5".to_owned(), 15), 
-        ("a6".to_owned(), 16), 
-        ("a7".to_owned(), 17), 
-        ("s2".to_owned(), 18), 
-        ("s3".to_owned(), 19),
-        ("s4".to_owned(), 20), 
-        ("s5".to_owned(), 21), 
-        ("s6".to_owned(), 22), 
-        ("s7".to_owned(), 23), 
-        ("s8".to_owned(), 24),
-        ("s9".to_owned(), 25), 
-        ("s10".to_owned(), 26), 
-        ("s11".to_owned(), 27), 
-        ("t3".to_owned(), 28), 
-        ("t4".to_owned(), 29),
-        ("t5".to_owned(), 30), 
-        ("t6".to_owned(), 31),
-    ]);
-
-    let parsed_data = parse_file("program.s")?;
-
-    let mut w = Vec::new();
-    for (inst, reg) in parsed_data {
-        match inst.as_str() {
-            "addi" => {
-                let (dest, src, imm) = (reg[0].clone(), reg[1].clone(), reg[2].clone());
-                if let (Some(&src_val), Ok(imm_val)) = (register_map.get(src.as_str()), imm.parse::<u64>()) {
-                    register_map.insert(dest, (src_val as u128 + imm_val as u128) % p);
-                }
-            }
-            "add" => {
-                let (dest, src1, src2) = (reg[0].clone(), reg[1].clone(), reg[2].clone());
-                if let (Some(&val1), Some(&val2)) = (register_map.get(src1.as_str()), register_map.get(src2.as_str())) {
-                    register_map.insert(dest, (val1 as u128 + val2 as u128) % p);
-                }
-            }
-            "mul" => {
-                let (dest, src1, src2) = (reg[0].clone(), reg[1].clone(), reg[2].clone());
-                if let (Some(&val1), Some(&val2)) = (register_map.get(src1.as_str()), register_map.get(src2.as_str())) {
-                    register_map.insert(dest, (val1 as u128 * val2 as u128) % p);
-                }
-            }
-            _ => {}
-        }
-
-        if let Some(&result) = register_map.get(&reg[0].clone()) {
-            w.push((reg[0].clone(), result % p));
-        }
-    }
+    let p = class_json[class_number]["p"].as_u64().unwrap();
 
+    let program = parse_file("program.s")?;
 
-    let w: Vec<u128> = w.iter().map(|(_, v)| *v).collect();
+    let (regs, w) = run(&program, p);
 
 
-    let mut z = vec![1];
-    let x: Vec<u128> = (0..=31).collect();
+    let x: Vec<u64> = (0..=31).collect();
+    let mut z = Vec::with_capacity(1 + x.len() + w.len());
+    z.push(1);
     z.extend(&x);
     z.extend(&w);
 
 
+    let register_map: Vec<(&str, u64)> = REGISTER_NAMES.iter().copied().zip(regs).collect();
     println!("Register Map: {:?}", register_map);
     println!("X: {:?}", x);
     println!("W: {:?}", w);